@@ -1,6 +1,12 @@
 import os
+import pickle
+import re
 import traceback
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+import httpx
+import numpy as np
 from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -8,7 +14,8 @@ from vectordb import VectorDB
 #from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
 # from langchain_google_genai import ChatGoogleGenerativeAI # Uncomment if using Google
-from PyPDF2 import PdfReader
+from pdf_loader import read_pdf
+from prompt_context import build_context
 
 # Load environment variables
 load_dotenv()
@@ -16,39 +23,94 @@ load_dotenv()
 # Define data directory
 DATA_DIR = "./data"
 
+# Extracted PDF text, keyed by file path and invalidated on mtime/size change
+# (or when the extractor changes)
+PDF_CACHE_PATH = "./.pdf_cache.pkl"
+PDF_EXTRACTOR = "pypdfium2-v3"
+
+# Answer cache settings
+CACHE_MAX_ENTRIES = 256
+SEMANTIC_CACHE_THRESHOLD = 0.97
+
+# Upper bound on generated tokens per answer
+MAX_TOKENS = 384
+
+# Timeout (seconds) for LLM API requests
+LLM_TIMEOUT = 30.0
+
+# Shared keep-alive HTTP/2 connection pool for all LLM API calls
+HTTP_CLIENT = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    timeout=LLM_TIMEOUT,
+)
+
+# Questions asking for reasoning rather than lookup go to the larger model
+COMPLEX_QUERY_PATTERN = re.compile(r"\b(expla|compar)", re.IGNORECASE)
+
+
+def _load_pdf_cache() -> dict:
+    """Load the extracted-text cache, or start an empty one if it is missing or unreadable."""
+    try:
+        with open(PDF_CACHE_PATH, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def _save_pdf_cache(cache: dict) -> None:
+    try:
+        with open(PDF_CACHE_PATH, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"[WARN] Could not write PDF cache: {e}")
+
+
 def load_documents() -> List[dict]:
     """
     Load documents for demonstration.
-    Reads PDF files from the data directory.
+    Reads PDF files from the data directory, parsing them in parallel processes.
+    Files unchanged since the last run (same mtime and size) are served from cache.
     """
-    results = []
-    
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
         print(f"[NOTE] Created missing directory: {DATA_DIR}. Please place your PDF there.")
         return []
 
     print(f"Scanning directory: {DATA_DIR}")
-    for root, _, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith(".pdf"):
-                file_path = os.path.join(root, file)
-                try:
-                    pdf_reader = PdfReader(file_path)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() or ""
-
-                    if text.strip():
-                        results.append({
-                            "content": text,
-                            "metadata": {"source": file_path}
-                        })
-                        print(f"Successfully read: {file}")
-                except Exception as e:
-                    print(f"Error reading {file_path}: {e}")
-
-    return results
+    files = [
+        os.path.join(root, file)
+        for root, _, filenames in os.walk(DATA_DIR)
+        for file in filenames
+        if file.endswith(".pdf")
+    ]
+    if not files:
+        return []
+
+    cache = _load_pdf_cache()
+    signatures = {}
+    for file_path in files:
+        stat = os.stat(file_path)
+        signatures[file_path] = (stat.st_mtime, stat.st_size, PDF_EXTRACTOR)
+
+    stale = [f for f in files if cache.get(f, {}).get("signature") != signatures[f]]
+    if stale:
+        if len(stale) == 1:
+            # Not worth starting a pool for a single file
+            docs = [read_pdf(stale[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=min(len(stale), os.cpu_count() or 1)) as executor:
+                docs = list(executor.map(read_pdf, stale))
+
+        for file_path, doc in zip(stale, docs):
+            cache[file_path] = {"signature": signatures[file_path], "document": doc}
+
+        # Drop entries for files that no longer exist
+        cache = {f: cache[f] for f in files}
+        _save_pdf_cache(cache)
+
+    results = [cache[f]["document"] for f in files]
+    return [doc for doc in results if doc is not None]
 
 
 class RAGAssistant:
@@ -59,75 +121,160 @@ class RAGAssistant:
 
     def __init__(self):
         """Initialize the RAG assistant."""
-        # Initialize LLM
-        self.llm = self._initialize_llm()
+        # In-process answer caches: exact (normalized question) and semantic
+        # (question embedding, cosine similarity above SEMANTIC_CACHE_THRESHOLD).
+        # Entries are keyed by n_results too, since it changes the retrieved context.
+        self._exact_cache: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._semantic_embeddings: List[np.ndarray] = []
+        self._semantic_n_results: List[int] = []
+        self._semantic_answers: List[str] = []
+
+        # Initialize LLMs: a fast model for lookups, a larger one for complex questions
+        self.llm = self._initialize_llm(os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"))
         if not self.llm:
             raise ValueError(
                 "No valid API key found. Please set GROQ_API_KEY in your .env file"
             )
+        self.complex_llm = self._initialize_llm(
+            os.getenv("GROQ_COMPLEX_MODEL", "llama-3.3-70b-versatile")
+        )
 
         # Initialize vector database
         self.vector_db = VectorDB()
 
-        # Create RAG prompt template
-        self.template_text = ("""
-            
-        You are an expert Academic Counselor for the School of Computer Engineering at KIIT University.
-        Your goal is to assist students by answering questions strictly based on the provided "Curricula and Syllabi (2022-23)" context.
-
-        GUIDELINES:
-        1.  **Source of Truth:** Answer ONLY using the information provided in the CONTEXT below. Do not make up information.
-        2.  **Course Queries:** If asked about a specific subject (e.g., "Machine Learning"), provide its Course Code, Credits, Prerequisites, and a summary of the units or textbooks if available.
-        3.  **Semester Inquiries:** If asked about a semester (e.g., "What subjects are in Sem 6?"), list the courses clearly with their Codes and Credits using bullet points.
-        4.  **Regulations:** If asked about rules (e.g., "Minor Degree", "Projects", "Internships"), explain the eligibility and requirements exactly as stated in the text.
-        5.  **Missing Info:** If the answer is not in the context, politely say: "I cannot find that specific detail in the official syllabus document."
-        6.  **Tone:** Maintain a professional, encouraging, and structured tone suitable for academic advising.
-
-        CONTEXT:
-        {context}
-
-        QUESTION:
-        {question}
-        COUNSELOR'S ANSWER:
-        """
+        # Create RAG prompt template. The static instructions are kept short and in
+        # the system message so the provider can reuse the cached prompt prefix.
+        self.template_text = (
+            "You are a KIIT SCE academic counselor. Answer ONLY from CONTEXT. "
+            "If absent, say 'I cannot find that specific detail in the official "
+            "syllabus document.' Use bullet points for lists."
         )
-        self.prompt_template = ChatPromptTemplate.from_template(self.template_text)
+        self.prompt_template = ChatPromptTemplate.from_messages([
+            ("system", self.template_text),
+            ("human", "CONTEXT:\n{context}\n\nQ: {question}\nA:"),
+        ])
 
-        # Create the chain
+        # Create the chains
         self.chain = self.prompt_template | self.llm | StrOutputParser()
+        self.complex_chain = self.prompt_template | self.complex_llm | StrOutputParser()
 
         print("RAG Assistant initialized successfully")
 
-    def _initialize_llm(self):
+    def _initialize_llm(self, model_name: str):
         """Initialize the LLM by checking for available API keys."""
         # Using Groq as requested
         if os.getenv("GROQ_API_KEY"):
-            model_name = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
             print(f"Using Groq model: {model_name}")
             return ChatGroq(
-                api_key=os.getenv("GROQ_API_KEY"), model=model_name, temperature=0.0
+                api_key=os.getenv("GROQ_API_KEY"),
+                model=model_name,
+                temperature=0.0,
+                max_tokens=MAX_TOKENS,
+                max_retries=2,
+                timeout=LLM_TIMEOUT,
+                http_client=HTTP_CLIENT,
             )
         return None
 
+    def _select_chain(self, input_text: str):
+        """Route questions that ask to explain or compare to the larger model."""
+        if COMPLEX_QUERY_PATTERN.search(input_text):
+            return self.complex_chain
+        return self.chain
+
     def add_documents(self, documents: List) -> None:
         """Add documents to the knowledge base."""
         self.vector_db.add_documents(documents)
 
+    def _retrieve_context(
+        self, input_text: str, n_results: int, query_embedding: np.ndarray
+    ) -> str:
+        """Retrieve relevant chunks and combine them into the prompt context."""
+        results = self.vector_db.search(
+            input_text, n_results=n_results, query_embedding=query_embedding
+        )
+        documents = results.get("documents", [])
+        return build_context(documents) if documents else "No relevant context found."
+
+    @staticmethod
+    def _cache_key(input_text: str, n_results: int) -> Tuple[str, int]:
+        return input_text.strip().lower(), n_results
+
+    def _semantic_lookup(self, query_embedding: np.ndarray, n_results: int) -> Optional[str]:
+        """Return the cached answer of the most similar previous question, if close enough."""
+        if not self._semantic_embeddings:
+            return None
+        scores = np.dot(np.vstack(self._semantic_embeddings), query_embedding)
+        scores[np.array(self._semantic_n_results) != n_results] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] > SEMANTIC_CACHE_THRESHOLD:
+            return self._semantic_answers[best]
+        return None
+
+    def _store_answer(self, key: Tuple[str, int], query_embedding: np.ndarray, answer: str) -> None:
+        """Add an answer to both caches, evicting the oldest entries when full."""
+        self._exact_cache[key] = answer
+        if len(self._exact_cache) > CACHE_MAX_ENTRIES:
+            self._exact_cache.popitem(last=False)
+
+        self._semantic_embeddings.append(query_embedding)
+        self._semantic_n_results.append(key[1])
+        self._semantic_answers.append(answer)
+        if len(self._semantic_answers) > CACHE_MAX_ENTRIES:
+            del self._semantic_embeddings[0]
+            del self._semantic_n_results[0]
+            del self._semantic_answers[0]
+
+    def _cached_answer(
+        self, key: Tuple[str, int], input_text: str
+    ) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Check the caches for a question. Returns (answer, query_embedding); the
+        embedding is computed only on an exact-cache miss and reused for retrieval.
+        """
+        if key in self._exact_cache:
+            self._exact_cache.move_to_end(key)
+            return self._exact_cache[key], None
+
+        query_embedding = self.vector_db.embed_query(input_text)
+        return self._semantic_lookup(query_embedding, key[1]), query_embedding
+
     def invoke(self, input_text: str, n_results: int = 3) -> str:
         """Query the RAG assistant."""
         
-        # 1. Retrieve relevant chunks
-        results = self.vector_db.search(input_text, n_results=n_results)
-        
-        # 2. Combine context
-        documents = results.get("documents", [])
-        context = "\n\n".join(documents) if documents else "No relevant context found."
+        # 1. Serve repeated or near-duplicate questions from cache
+        key = self._cache_key(input_text, n_results)
+        cached, query_embedding = self._cached_answer(key, input_text)
+        if cached is not None:
+            return cached
+
+        # 2. Retrieve relevant chunks and combine context
+        context = self._retrieve_context(input_text, n_results, query_embedding)
         
         # 3. Generate response
-        response = self.chain.invoke({"context": context, "question": input_text})
+        chain = self._select_chain(input_text)
+        response = chain.invoke({"context": context, "question": input_text})
         
+        self._store_answer(key, query_embedding, response)
         return response
 
+    def stream(self, input_text: str, n_results: int = 3) -> Iterator[str]:
+        """Query the RAG assistant, yielding the answer as tokens arrive."""
+        key = self._cache_key(input_text, n_results)
+        cached, query_embedding = self._cached_answer(key, input_text)
+        if cached is not None:
+            yield cached
+            return
+
+        context = self._retrieve_context(input_text, n_results, query_embedding)
+        chunks = []
+        chain = self._select_chain(input_text)
+        for chunk in chain.stream({"context": context, "question": input_text}):
+            chunks.append(chunk)
+            yield chunk
+
+        self._store_answer(key, query_embedding, "".join(chunks))
+
 
 def main():
     """Main function to demonstrate the RAG assistant."""
@@ -138,15 +285,19 @@ def main():
         print("Initializing RAG Assistant...")
         assistant = RAGAssistant()
 
-        # Load sample documents
-        print("\nLoading documents...")
-        sample_docs = load_documents()
-        
-        if sample_docs:
-            print(f"Loaded {len(sample_docs)} sample documents")
-            assistant.add_documents(sample_docs)
+        # Load sample documents (skipped entirely once the collection is populated)
+        existing_count = assistant.vector_db.count()
+        if existing_count > 0:
+            print(f"\n[INFO] Collection already contains {existing_count} chunks. Skipping document loading.")
         else:
-            print("No documents found to process (or documents already in DB).")
+            print("\nLoading documents...")
+            sample_docs = load_documents()
+
+            if sample_docs:
+                print(f"Loaded {len(sample_docs)} sample documents")
+                assistant.add_documents(sample_docs)
+            else:
+                print("No documents found to process.")
 
         print("\nReady! Ask questions about the syllabus.")
         
@@ -161,8 +312,10 @@ def main():
                 continue
             else:
                 print("Thinking...")
-                result = assistant.invoke(question)
-                print(f"\nAnswer:\n{result}")
+                print("\nAnswer:")
+                for chunk in assistant.stream(question):
+                    print(chunk, end="", flush=True)
+                print()
 
     except Exception as e:
         print(f"Error running RAG assistant: {e}")
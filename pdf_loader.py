@@ -0,0 +1,31 @@
+import os
+from typing import Optional
+import pypdfium2 as pdfium
+
+
+def _page_text(page: pdfium.PdfPage) -> str:
+    """Text of one page, with PDFium's CRLF (and bare CR) line endings turned into LF."""
+    return page.get_textpage().get_text_range().replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_pdf(file_path: str) -> Optional[dict]:
+    """
+    Extract the text of a single PDF. Runs in worker processes, so this module
+    only imports what extraction needs. Returns None for empty or unreadable files.
+    """
+    try:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            text = "\n".join(_page_text(page) for page in pdf)
+        finally:
+            pdf.close()
+
+        if text.strip():
+            print(f"Successfully read: {os.path.basename(file_path)}")
+            return {
+                "content": text,
+                "metadata": {"source": file_path}
+            }
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+    return None
@@ -0,0 +1,44 @@
+from difflib import SequenceMatcher
+from typing import List
+
+# Context trimming: retrieved chunks share up to chunk_overlap (200) characters,
+# searched within a bounded window, and each chunk is clipped before prompting
+CONTEXT_OVERLAP_WINDOW = 250
+MIN_CONTEXT_OVERLAP = 20
+MAX_CONTEXT_CHUNK_CHARS = 800
+
+
+def _overlap_length(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is also a prefix of b (0 if too short)."""
+    tail, head = a[-CONTEXT_OVERLAP_WINDOW:], b[:CONTEXT_OVERLAP_WINDOW]
+    match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(
+        0, len(tail), 0, len(head)
+    )
+    if match.b == 0 and match.a + match.size == len(tail) and match.size >= MIN_CONTEXT_OVERLAP:
+        return match.size
+    return 0
+
+
+def build_context(documents: List[str]) -> str:
+    """
+    Combine retrieved chunks into prompt context. Each chunk is clipped first,
+    then exact duplicates and text shared with an already kept chunk are
+    dropped, so removed text always survives in the kept copy.
+    """
+    seen = set()
+    kept = []
+    for doc in documents:
+        if doc in seen:
+            continue
+        seen.add(doc)
+
+        doc = doc[:MAX_CONTEXT_CHUNK_CHARS]
+        for previous in kept:
+            doc = doc[_overlap_length(previous, doc):]
+            cut = _overlap_length(doc, previous)
+            if cut:
+                doc = doc[:-cut]
+        if doc.strip():
+            kept.append(doc)
+
+    return "\n\n".join(kept)
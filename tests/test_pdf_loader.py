@@ -0,0 +1,23 @@
+import os
+
+from pdf_loader import read_pdf
+
+SYLLABUS_PDF = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "Syllabus Updated -SCE-2025-04-05.pdf",
+)
+
+
+def test_read_pdf_normalizes_line_endings():
+    doc = read_pdf(SYLLABUS_PDF)
+
+    assert doc["metadata"] == {"source": SYLLABUS_PDF}
+    assert "\r" not in doc["content"]
+
+
+def test_read_pdf_returns_none_for_unreadable_file(tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    assert read_pdf(str(broken)) is None
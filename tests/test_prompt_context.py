@@ -0,0 +1,39 @@
+from prompt_context import MAX_CONTEXT_CHUNK_CHARS, build_context
+
+# Source text made of unique tokens, so token membership pins down exact positions
+TEXT = "".join(f"w{i:04d} " for i in range(1000))
+
+
+def _sliding_chunks(size, overlap, count):
+    """Consecutive chunks as produced by the splitter: each shares `overlap` chars with the next."""
+    step = size - overlap
+    return [TEXT[i * step:i * step + size] for i in range(count)]
+
+
+def _tokens(text):
+    # Ignore the partial tokens cut at either edge of a slice
+    return set(text.split()[1:-1])
+
+
+def test_overlapping_text_of_long_chunks_is_kept():
+    chunks = _sliding_chunks(1000, 200, 3)
+    assert len(chunks[0]) > MAX_CONTEXT_CHUNK_CHARS
+
+    for documents in (chunks, chunks[::-1]):
+        context = build_context(documents)
+        for chunk in documents:
+            assert _tokens(chunk[:MAX_CONTEXT_CHUNK_CHARS]) <= set(context.split())
+
+
+def test_every_character_of_short_chunks_is_kept():
+    chunks = _sliding_chunks(600, 200, 3)
+    context = build_context(chunks)
+
+    assert TEXT[:1400] == context.replace("\n\n", "")
+
+
+def test_overlap_and_duplicates_are_dropped():
+    chunks = _sliding_chunks(600, 200, 2)
+    context = build_context(chunks + [chunks[0]])
+
+    assert len(context) == 1000 + len("\n\n")
@@ -1,9 +1,94 @@
+import json
 import os
+import sqlite3
 import chromadb
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import numpy as np
+import torch
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Union
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from sentence_transformers import (
+    SentenceTransformer,
+    export_dynamic_quantized_onnx_model,
+    quantize_embeddings,
+)
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+if TYPE_CHECKING:
+    from model2vec import StaticModel
+
+# Directory where ChromaDB (and the optional int8 index) is persisted
+PERSIST_DIR = "./chroma_db"
+
+# Directory where exported/quantized embedding models are cached
+MODEL_CACHE_DIR = "./model_cache"
+
+# Number of chunks embedded and written to Chroma per ingest batch
+INGEST_BATCH_SIZE = 256
+
+# Rows of the int8 index scored per block (bounds the int32 upcast's memory)
+INT8_SCORE_BLOCK = 4096
+
+# On CPU, let PyTorch use every available core for the embedding forward pass
+if not torch.cuda.is_available():
+    torch.set_num_threads(os.cpu_count() or 1)
+
+
+@register_embedding_function
+class _ModelEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Chroma embedding function backed by the VectorDB's already loaded model,
+    so the collection reuses the quantized model instead of loading its own copy.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        model_name: str,
+        backend: str,
+    ):
+        self.encode = encode
+        self.model_name = model_name
+        self.backend = backend
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return list(self.encode(list(input)))
+
+    @staticmethod
+    def name() -> str:
+        return "kiit_sce_model"
+
+    def default_space(self) -> str:
+        return "ip"
+
+    def supported_spaces(self) -> List[str]:
+        return ["ip", "cosine", "l2"]
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "backend": self.backend}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "_ModelEmbeddingFunction":
+        """
+        Rebuild from a persisted collection config. Chroma also calls this from
+        is_legacy() on every open, so the fallback FP32 model loads lazily, on
+        first use only.
+        """
+        model = None
+
+        def encode(texts: List[str]) -> np.ndarray:
+            nonlocal model
+            if config["backend"] == "model2vec":
+                raise ValueError("Model2Vec collections must be opened through VectorDB")
+            if model is None:
+                model = SentenceTransformer(config["model_name"])
+            return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+        return _ModelEmbeddingFunction(encode, config["model_name"], config["backend"])
+
+
 class VectorDB:
     """
     A simple vector database wrapper using ChromaDB with HuggingFace embeddings.
@@ -19,39 +104,260 @@ class VectorDB:
         self.embedding_model_name = embedding_model or os.getenv(
             "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
         )
+        # "onnx" (INT8 quantized), "torch" (FP16 on CUDA, FP32 on CPU) or
+        # "model2vec" (static embeddings for CPU-only deployments; these have a
+        # different dimension, so use a fresh CHROMA_COLLECTION_NAME with it).
+        # Defaults to torch when a GPU is available and onnx otherwise.
+        self.embedding_backend = os.getenv(
+            "EMBEDDING_BACKEND", "torch" if torch.cuda.is_available() else "onnx"
+        )
+
+        # "float32" (Chroma's HNSW index) or "int8" (a scalar-quantized index,
+        # memory-mapped from disk and scanned exhaustively, with documents and
+        # metadata kept beside it; new chunks are not written to Chroma at all)
+        self.embedding_precision = os.getenv("EMBEDDING_PRECISION", "float32")
+
+        # Text splitter shared by every chunk_text call
+        self.set_chunk_size(1000)
 
         # Initialize ChromaDB client (Persistent - saves to disk)
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+        self.client = chromadb.PersistentClient(path=PERSIST_DIR)
 
         # Load embedding model
         print(f"Loading embedding model: {self.embedding_model_name}")
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+        self.embedding_model = self._load_embedding_model()
 
-        # Get or create collection
+        # Get or create collection (Chroma embeds documents/queries itself).
+        # HNSW settings only apply when the collection is first created: a lower
+        # construction_ef speeds up ingest of the small static corpus, while a
+        # higher search_ef improves query recall. Embeddings are unit-normalized in
+        # _encode, so inner product ranks exactly like cosine without the norms.
         self.collection = self.client.get_or_create_collection(
             name=self.collection_name,
-            metadata={"description": "RAG document collection"},
+            metadata={
+                "description": "RAG document collection",
+                "hnsw:space": "ip",
+                "hnsw:construction_ef": 100,
+                "hnsw:M": 32,
+                "hnsw:search_ef": 64,
+            },
+            embedding_function=_ModelEmbeddingFunction(
+                self._encode, self.embedding_model_name, self.embedding_backend
+            ),
         )
 
+        self._load_int8_index()
+
         print(f"Vector database initialized with collection: {self.collection_name}")
 
-    def chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
+    def _load_embedding_model(self) -> Union[SentenceTransformer, "StaticModel"]:
         """
-        Splits text using RecursiveCharacterTextSplitter to respect document structure.
+        Load the embedding model. With the ONNX backend, an INT8 dynamically quantized
+        export is created once and cached on disk, then reused on every start.
+        The torch backend runs in half precision when CUDA is available, and the
+        model2vec backend distills a static-embedding model once and caches it.
+        """
+        if self.embedding_backend == "model2vec":
+            return self._load_static_model()
+
+        if self.embedding_backend != "onnx":
+            model = SentenceTransformer(self.embedding_model_name)
+            if torch.cuda.is_available():
+                model = model.half().to("cuda")
+            return model
+
+        quantization = os.getenv("ONNX_QUANTIZATION", "avx512_vnni")
+        model_dir = os.path.join(MODEL_CACHE_DIR, self.embedding_model_name.replace("/", "__"))
+        file_name = f"onnx/model_qint8_{quantization}.onnx"
+
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            print(f"Exporting INT8 ONNX model to {model_dir} (one-time step)...")
+            model = SentenceTransformer(self.embedding_model_name, backend="onnx")
+            model.save(model_dir)
+            export_dynamic_quantized_onnx_model(model, quantization, model_dir)
+
+        return SentenceTransformer(
+            model_dir, backend="onnx", model_kwargs={"file_name": file_name}
+        )
+
+    def _load_static_model(self) -> "StaticModel":
+        """
+        Load a Model2Vec distillation of the embedding model (token embeddings
+        averaged per sentence, no transformer layers). Exposes the same encode().
+        """
+        from model2vec import StaticModel
+
+        model_dir = os.path.join(
+            MODEL_CACHE_DIR, self.embedding_model_name.replace("/", "__") + "__m2v"
+        )
+        if not os.path.exists(model_dir):
+            from model2vec.distill import distill
+
+            print(f"Distilling static embedding model to {model_dir} (one-time step)...")
+            distill(self.embedding_model_name, pca_dims=256).save_pretrained(model_dir)
+
+        return StaticModel.from_pretrained(model_dir, normalize=True)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into unit-length vectors, returned as a float32 numpy array.
+        StaticModel ignores the SentenceTransformer-only keyword arguments (it is
+        loaded with normalize=True instead) and returns float16, hence the cast.
+        """
+        embeddings = self.embedding_model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            batch_size=64,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _int8_path(self, part: str, ext: str = "npy") -> str:
+        return os.path.join(PERSIST_DIR, f"{self.collection_name}.int8_{part}.{ext}")
+
+    def _load_int8_index(self) -> None:
+        """
+        Memory-map the int8 index if it is enabled. A missing index is built from
+        an already populated Chroma collection, so switching modes needs no re-ingest.
         """
+        self.int8_embeddings = None
+        if self.embedding_precision != "int8":
+            return
+
+        if not os.path.exists(self._int8_path("embeddings")):
+            existing_count = self.collection.count()
+            if existing_count == 0:
+                return
+            print(f"[INFO] Building int8 index from {existing_count} existing chunks...")
+            records = self.collection.get(include=["embeddings", "documents", "metadatas"])
+            self._build_int8_index(
+                records["ids"],
+                np.asarray(records["embeddings"], dtype=np.float32),
+                records["documents"],
+                records["metadatas"],
+            )
+            return
+
+        self.int8_embeddings = np.load(self._int8_path("embeddings"), mmap_mode="r")
+        self.int8_ranges = np.load(self._int8_path("ranges"))
+
+    def _build_int8_index(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadatas: List[dict],
+    ) -> None:
+        """
+        Scalar-quantize the corpus embeddings to int8, calibrated on their own
+        per-dimension ranges, and persist them next to the Chroma database. The
+        chunks' documents and metadata go to a sqlite sidecar keyed by row, so
+        only the top-k rows are ever loaded.
+        """
+        ranges = np.vstack((embeddings.min(axis=0), embeddings.max(axis=0)))
+        int8_embeddings = quantize_embeddings(embeddings, precision="int8", ranges=ranges)
+
+        with closing(sqlite3.connect(self._int8_path("records", "sqlite3"))) as conn, conn:
+            conn.execute("DROP TABLE IF EXISTS chunks")
+            conn.execute(
+                "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT, document TEXT, metadata TEXT)"
+            )
+            conn.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                (
+                    (row, chunk_id, document, json.dumps(metadata))
+                    for row, (chunk_id, document, metadata) in enumerate(
+                        zip(ids, documents, metadatas)
+                    )
+                ),
+            )
+
+        np.save(self._int8_path("ranges"), ranges)
+        # Written last: its presence marks the index as complete
+        np.save(self._int8_path("embeddings"), int8_embeddings)
+        self._load_int8_index()
+
+    def _search_int8(self, query_embedding: np.ndarray, n_results: int) -> Dict[str, Any]:
+        """
+        Rank chunks by int8 dot product with the quantized query (an exhaustive
+        scan, fine for a corpus of this size), then rescore the top rows against
+        the float query using their dequantized embeddings.
+        """
+        query_int8 = quantize_embeddings(
+            query_embedding[None, :], precision="int8", ranges=self.int8_ranges
+        )[0].astype(np.int32)
+
+        scores = np.concatenate([
+            self.int8_embeddings[i:i + INT8_SCORE_BLOCK].astype(np.int32) @ query_int8
+            for i in range(0, len(self.int8_embeddings), INT8_SCORE_BLOCK)
+        ])
+
+        n_results = min(n_results, len(scores))
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+
+        # Dequantize to bucket centres, giving 1 - cosine like Chroma's "ip" distance
+        starts = self.int8_ranges[0]
+        steps = (self.int8_ranges[1] - self.int8_ranges[0]) / 255  # 0 for constant dims
+        dequantized = starts + (self.int8_embeddings[top].astype(np.float32) + 128.5) * steps
+        distances = 1.0 - dequantized @ query_embedding
+        order = np.argsort(distances)
+        top, distances = top[order], distances[order]
+
+        rows = [int(row) for row in top]
+        with closing(sqlite3.connect(self._int8_path("records", "sqlite3"))) as conn:
+            records = {
+                row: (chunk_id, document, json.loads(metadata))
+                for row, chunk_id, document, metadata in conn.execute(
+                    f"SELECT row, id, document, metadata FROM chunks "
+                    f"WHERE row IN ({','.join('?' * len(rows))})",
+                    rows,
+                )
+            }
+
+        return {
+            "documents": [records[row][1] for row in rows],
+            "metadatas": [records[row][2] for row in rows],
+            "distances": [float(distance) for distance in distances],
+            "ids": [records[row][0] for row in rows],
+        }
+
+    def count(self) -> int:
+        """
+        Number of indexed chunks, from the int8 index when it is in use.
+        """
+        if self.int8_embeddings is not None:
+            return len(self.int8_embeddings)
+        return self.collection.count()
+
+    @staticmethod
+    def _make_splitter(chunk_size: int) -> RecursiveCharacterTextSplitter:
         # OPTION 2: Use LangChain's RecursiveCharacterTextSplitter
         # Customized separators for Syllabus structure
-        text_splitter = RecursiveCharacterTextSplitter(
+        return RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=200,
-            separators=["\nUNIT ", "\nCourse Title", "\n\n", "\n", " ", ""]
+            separators=["\nUNIT ", "\nCourse Title", "\n\n", "\n", " ", ""],
+            length_function=len,
+            is_separator_regex=False,
         )
-        
-        # Split text into Document objects then extract content
-        docs = text_splitter.create_documents([text])
-        chunks = [doc.page_content for doc in docs]
 
-        return chunks
+    def set_chunk_size(self, chunk_size: int) -> None:
+        """
+        Change the default chunk size by rebuilding the shared text splitter.
+        """
+        self.chunk_size = chunk_size
+        self._splitter = self._make_splitter(chunk_size)
+
+    def chunk_text(self, text: str, chunk_size: int = None) -> List[str]:
+        """
+        Splits text using RecursiveCharacterTextSplitter to respect document structure.
+        A chunk_size other than the default uses a one-off splitter.
+        """
+        if chunk_size is not None and chunk_size != self.chunk_size:
+            return self._make_splitter(chunk_size).split_text(text)
+
+        return self._splitter.split_text(text)
 
     def add_documents(self, documents: List[dict]) -> None:
         """
@@ -68,69 +374,104 @@ class VectorDB:
             content = doc.get("content", "")
             base_metadata = doc.get("metadata", {})
 
+            # Metadata (must be simple key-values for Chroma), converted once per
+            # document and shared by all of its chunks (Chroma does not mutate it)
+            meta = {k: str(v) for k, v in base_metadata.items()}
+
             # Split document into chunks
             chunks = self.chunk_text(content)
 
             # Prepare batch data
-            for chunk_idx, chunk_text in enumerate(chunks):
-                # Create unique ID
-                chunk_id = f"doc_{doc_idx}_chunk_{chunk_idx}"
-                
-                # Metadata (must be simple key-values for Chroma)
-                meta = {k: str(v) for k, v in base_metadata.items()}
-                
-                all_ids.append(chunk_id)
-                all_documents.append(chunk_text)
-                all_metadatas.append(meta)
+            all_ids.extend(f"doc_{doc_idx}_chunk_{chunk_idx}" for chunk_idx in range(len(chunks)))
+            all_documents.extend(chunks)
+            all_metadatas.extend([meta] * len(chunks))
 
         if not all_documents:
             print("No content to add.")
             return
 
         # Check if data already exists to avoid re-embedding
-        existing_count = self.collection.count()
+        existing_count = self.count()
         if existing_count > 0:
             print(f"[INFO] Collection already contains {existing_count} chunks. Skipping re-embedding.")
             return
 
         print(f"Creating embeddings for {len(all_documents)} chunks... (This may take time)")
+
+        # Sort chunks by length so each batch pads to a similar length. IDs and
+        # metadata are permuted alongside, so no un-permuting is needed afterwards.
+        order = sorted(range(len(all_documents)), key=lambda i: len(all_documents[i]))
+        all_ids = [all_ids[i] for i in order]
+        all_documents = [all_documents[i] for i in order]
+        all_metadatas = [all_metadatas[i] for i in order]
         
-        # Create embeddings in batches to avoid memory issues
-        batch_size = 64
+        # Embed the next batch in a worker thread while the current one is written to
+        # Chroma (or, in int8 mode, collected for quantization)
         total_chunks = len(all_documents)
-        
-        for i in range(0, total_chunks, batch_size):
-            end = min(i + batch_size, total_chunks)
-            batch_docs = all_documents[i:end]
-            batch_ids = all_ids[i:end]
-            batch_metas = all_metadatas[i:end]
-            
-            # Encode batch
-            batch_embeddings = self.embedding_model.encode(batch_docs).tolist()
-            
-            # Add to ChromaDB
-            self.collection.add(
-                ids=batch_ids,
-                documents=batch_docs,
-                embeddings=batch_embeddings,
-                metadatas=batch_metas
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            embed_future = executor.submit(self._encode, all_documents[:INGEST_BATCH_SIZE])
+
+            for i in range(0, total_chunks, INGEST_BATCH_SIZE):
+                end = min(i + INGEST_BATCH_SIZE, total_chunks)
+                batch_embeddings = embed_future.result()
+
+                if end < total_chunks:
+                    embed_future = executor.submit(
+                        self._encode, all_documents[end:end + INGEST_BATCH_SIZE]
+                    )
+
+                if self.embedding_precision == "int8":
+                    all_embeddings.append(batch_embeddings)
+                else:
+                    # Add to ChromaDB (ndarray embeddings, no list conversion)
+                    self.collection.add(
+                        ids=all_ids[i:end],
+                        documents=all_documents[i:end],
+                        embeddings=batch_embeddings,
+                        metadatas=all_metadatas[i:end]
+                    )
+                print(f"Indexed {end}/{total_chunks} chunks...", end="\r")
+
+        if all_embeddings:
+            self._build_int8_index(
+                all_ids, np.vstack(all_embeddings), all_documents, all_metadatas
             )
-            print(f"Indexed {end}/{total_chunks} chunks...", end="\r")
 
         print("\nDocuments added to vector database")
 
-    def search(self, query: str, n_results: int = 5) -> Dict[str, Any]:
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Create a unit-length embedding for a single query.
+        """
+        return self._encode([query])[0]
+
+    def search(
+        self, query: str, n_results: int = 5, query_embedding: np.ndarray = None
+    ) -> Dict[str, Any]:
         """
         Search for similar documents in the vector database.
+        A precomputed query embedding (see embed_query) is used if given.
+        Distances are 1 - cosine similarity; with the int8 index they are
+        computed from dequantized embeddings, so they are approximate.
         """
-        # Create query embedding
-        query_embedding = self.embedding_model.encode([query]).tolist()
+        if self.int8_embeddings is not None and len(self.int8_embeddings) > 0:
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            return self._search_int8(query_embedding, n_results)
 
-        # Query the collection
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=n_results
-        )
+        if query_embedding is not None:
+            # Pass a (1, dim) ndarray straight through, no list conversion
+            results = self.collection.query(
+                query_embeddings=query_embedding.reshape(1, -1),
+                n_results=n_results
+            )
+        else:
+            # Query the collection (embedded by the collection's embedding function)
+            results = self.collection.query(
+                query_texts=[query],
+                n_results=n_results
+            )
 
         # Handle empty results
         if not results['ids']: